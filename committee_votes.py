@@ -1,7 +1,14 @@
 import requests
 import json
-import time
 import os
+import time
+import hashlib
+import tempfile
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rate_limiter import RateLimiter
 
 # --- Configuration ---
 # Base URL for the Koios API
@@ -14,6 +21,101 @@ HEADERS = {
 GIST_ID = "7820f9ea2354d0fb8e1c160cae53adf1"
 GIST_FILENAME = "committee.json" # The filename within the Gist to update
 GITHUB_TOKEN = os.environ.get("GIST_UPDATE_TOKEN")
+# Maximum number of member vote requests in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+# Politeness limit for Koios requests (token bucket, requests per second)
+KOIOS_MAX_REQUESTS_PER_SECOND = 4
+
+# On-disk response cache (persisted between workflow runs via actions/cache)
+CACHE_DIR = os.environ.get("KOIOS_CACHE_DIR", os.path.join(".cache", "koios"))
+MEMBERS_CACHE_TTL = 3600 # seconds
+VOTES_CACHE_TTL = 300 # seconds
+# Hash of the last content successfully pushed to the Gist
+GIST_HASH_FILE = os.path.join(".cache", "committee_gist.sha256")
+
+# Shared session so every Koios/GitHub call reuses pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+KOIOS_RATE_LIMITER = RateLimiter(KOIOS_MAX_REQUESTS_PER_SECOND)
+
+def write_file_atomic(path, text):
+    """
+    Writes text to a file atomically.
+
+    The data goes to a temporary file in the same directory which is then
+    renamed over the target, so an interrupted run never leaves a partially
+    written file behind.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def cached_get_json(url, params=None, ttl=300):
+    """
+    Performs a GET request through a small on-disk TTL cache.
+
+    Fresh entries are returned without touching the network. Stale entries are
+    revalidated with If-None-Match when the API supplied an ETag, and a 304
+    response is treated as a cache hit.
+
+    Args:
+        url (str): The endpoint to fetch.
+        params (dict): Optional query parameters.
+        ttl (int): Number of seconds a cached response stays fresh.
+
+    Returns:
+        The parsed JSON response.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+    """
+    key = hashlib.md5(f"GET{url}{sorted((params or {}).items())}".encode()).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+
+    entry = None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if entry and entry.get("expires_at", 0) > time.time():
+        return entry["value"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+
+    KOIOS_RATE_LIMITER.acquire()
+    response = SESSION.get(url, params=params, headers=headers, timeout=30)
+    if response.status_code == 304 and entry:
+        value = entry["value"]
+        etag = response.headers.get("ETag", entry["etag"])
+    else:
+        response.raise_for_status()
+        value = response.json()
+        etag = response.headers.get("ETag")
+
+    try:
+        entry = {"value": value, "etag": etag, "expires_at": time.time() + ttl}
+        write_file_atomic(cache_path, json.dumps(entry))
+    except OSError as e:
+        print(f"⚠️ Could not write response cache: {e}")
+
+    return value
 
 def get_committee_members():
     """
@@ -25,9 +127,7 @@ def get_committee_members():
     endpoint = f"{KOIOS_BASE_URL}/committee_info"
     print("🔍 Step 1: Fetching list of all committee members...")
     try:
-        response = requests.get(endpoint, headers=HEADERS, timeout=30)
-        response.raise_for_status()  
-        data = response.json()
+        data = cached_get_json(endpoint, ttl=MEMBERS_CACHE_TTL)
         
         if data and isinstance(data, list) and 'members' in data[0]:
             print("✅ Successfully fetched and parsed committee members.")
@@ -43,23 +143,61 @@ def get_committee_members():
         print(f"❌ Error parsing the member data structure: {e}")
         return None
 
-def get_votes_for_member(member_id):
+def get_published_votes():
+    """
+    Reads the committee votes from the currently published Gist file.
+    
+    Returns:
+        list: The previously published vote objects, or an empty list if the
+        Gist cannot be read (in which case every member is fetched in full).
+    """
+    gist_url = f"https://api.github.com/gists/{GIST_ID}"
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"token {GITHUB_TOKEN}"
+
+    print("🔍 Reading previously published votes from the Gist...")
+    try:
+        response = SESSION.get(gist_url, headers=headers, timeout=30)
+        response.raise_for_status()
+        gist_file = response.json().get("files", {}).get(GIST_FILENAME)
+        if not gist_file:
+            return []
+
+        content = gist_file.get("content", "")
+        if gist_file.get("truncated"):
+            # Large files are truncated in the API response; fetch the raw file instead.
+            raw_response = SESSION.get(gist_file["raw_url"], timeout=30)
+            raw_response.raise_for_status()
+            content = raw_response.text
+
+        votes = json.loads(content).get("committee_votes", [])
+        print(f"✅ Found {len(votes)} previously published votes.")
+        return votes
+    except (requests.exceptions.RequestException, ValueError, AttributeError, KeyError) as e:
+        print(f"⚠️ Could not read published votes, fetching full history: {e}")
+        return []
+
+def get_votes_for_member(member_id, since=0):
     """
     Fetches the voting history for a specific committee member using their ID.
     
     Args:
         member_id (str): The '_cc_hot_id' of the committee member.
+        since (int): Only return votes with a block_time after this timestamp.
         
     Returns:
         list: A list of vote objects, or None if the request fails.
     """
     endpoint = f"{KOIOS_BASE_URL}/committee_votes"
     params = {"_cc_hot_id": member_id}
+    if since:
+        # Votes are append-only, so only rows newer than the cursor are needed.
+        params["block_time"] = f"gt.{since}"
+        params["order"] = "block_time.desc"
     print(f"🔍 Fetching votes for member: {member_id}...")
     try:
-        response = requests.get(endpoint, headers=HEADERS, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        return cached_get_json(endpoint, params=params, ttl=VOTES_CACHE_TTL)
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching votes for {member_id}: {e}")
         return None
@@ -75,23 +213,43 @@ def update_gist(data_to_upload):
     gist_url = f"https://api.github.com/gists/{GIST_ID}"
     headers = {
         "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
+        "Accept": "application/vnd.github.v3+json",
+        "Content-Type": "application/json"
     }
     
     # The content for the Gist file is the JSON-formatted string of our combined data
+    content = json.dumps(data_to_upload, indent=2)
+
+    # Skip the PATCH entirely when the content matches the last successful upload
+    new_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    try:
+        with open(GIST_HASH_FILE, "r", encoding="utf-8") as f:
+            prev_hash = f.read().strip()
+    except OSError:
+        prev_hash = None
+    if new_hash == prev_hash:
+        print("\n✅ No changes since the last upload; skipping Gist update.")
+        return
+
     payload = {
         "files": {
             GIST_FILENAME: {
-                "content": json.dumps(data_to_upload, indent=2)
+                "content": content
             }
         }
     }
+    # Encode the request body to bytes once so requests sends it as-is
+    body = json.dumps(payload).encode("utf-8")
     
     print(f"\n🚀 Step 3: Updating Gist file '{GIST_FILENAME}'...")
     try:
-        response = requests.patch(gist_url, headers=headers, data=json.dumps(payload), timeout=30)
+        response = SESSION.patch(gist_url, headers=headers, data=body, timeout=30)
         response.raise_for_status()
         print("✅ Gist updated successfully!")
+        try:
+            write_file_atomic(GIST_HASH_FILE, new_hash)
+        except OSError as e:
+            print(f"⚠️ Could not record Gist content hash: {e}")
     except requests.exceptions.RequestException as e:
         print(f"❌ Error updating Gist: {e}")
         if response:
@@ -107,28 +265,40 @@ def main():
         print("\nCould not retrieve committee members. Exiting.")
         return
 
-    all_votes = []
     print("\n--- 🗳️  Step 2: Processing All Committee Vote Records ---")
 
-    for member in members:
-        member_id = member.get("cc_hot_id")
+    member_ids = [member.get("cc_hot_id") for member in members]
+    member_ids = [member_id for member_id in member_ids if member_id]
 
-        if not member_id:
-            continue
-        
-        votes = get_votes_for_member(member_id)
-        
+    # Start from the votes already published for current members and only fetch newer ones.
+    published_votes = get_published_votes()
+    last_seen = {}
+    for vote in published_votes:
+        member_id = vote.get('member_id')
+        last_seen[member_id] = max(last_seen.get(member_id, 0), vote.get('block_time') or 0)
+
+    current_members = set(member_ids)
+    all_votes = [vote for vote in published_votes if vote.get('member_id') in current_members]
+
+    # Fetch every member's votes concurrently; the pool size caps in-flight requests.
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        results = list(executor.map(
+            lambda member_id: get_votes_for_member(member_id, last_seen.get(member_id, 0)),
+            member_ids
+        ))
+
+    for member_id, votes in zip(member_ids, results):
         if votes:
-            print(f"✅ Found {len(votes)} votes for {member_id}.")
+            print(f"✅ Found {len(votes)} new votes for {member_id}.")
             for vote in votes:
                 vote['member_id'] = member_id
-            all_votes.extend(votes)
+                # Normalize so the sort key is always present and comparable
+                vote['block_time'] = vote.get('block_time') or 0
+                all_votes.append(vote)
         else:
-            print(f"No votes found for {member_id}.")
-        
-        time.sleep(0.25)
+            print(f"No new votes found for {member_id}.")
 
-    all_votes_sorted = sorted(all_votes, key=lambda x: x.get('block_time', 0), reverse=True)
+    all_votes_sorted = sorted(all_votes, key=itemgetter('block_time'), reverse=True)
     
     # Create the single dictionary to hold all the data.
     combined_data = {
@@ -5,16 +5,30 @@ import requests
 import json
 import csv
 import io
-from datetime import datetime
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- Blockfrost Configuration ---
 BF_API_URL = "https://cardano-mainnet.blockfrost.io/api/v0"
 BF_ENDPOINT = "/gov/proposals"
+BF_PAGE_SIZE = 100
+BF_PAGE_CONCURRENCY = 8 # Pages requested in parallel per round
 
 # --- GitHub Gist Configuration ---
 GH_API_URL = "https://api.github.com/gists"
 GIST_FILENAME = "cardano_governance_proposals.csv"
 
+# --- HTTP Session ---
+# A single session reuses keep-alive connections to Blockfrost and GitHub.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
 # ==============================================================================
 # PART 1: FETCH DATA FROM BLOCKFROST
 # ==============================================================================
@@ -27,33 +41,48 @@ def get_blockfrost_project_id():
         exit(1)
     return project_id
 
+def fetch_governance_page(headers, page):
+    """Fetches a single page of governance action proposals from Blockfrost."""
+    params = {'page': page, 'count': BF_PAGE_SIZE}
+    response = SESSION.get(BF_API_URL + BF_ENDPOINT, headers=headers, params=params)
+    response.raise_for_status()
+    return response.json()
+
 def fetch_all_governance_actions(project_id):
-    """Fetches all governance action proposals from Blockfrost, handling pagination."""
+    """
+    Fetches all governance action proposals from Blockfrost, handling pagination.
+    After the first page, pages are requested concurrently in rounds of
+    BF_PAGE_CONCURRENCY until a short (or empty) page marks the end.
+    """
     # THE FIX: Header key changed to 'Project_id' with a capital 'P'.
     headers = {'Project_id': project_id}
     all_proposals = []
-    page = 1
     
     print("Fetching governance action proposals from Cardano mainnet...")
-    while True:
-        params = {'page': page, 'count': 100}
-        try:
-            response = requests.get(BF_API_URL + BF_ENDPOINT, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if not data:
-                print("Reached the last page of results.")
-                break
-            print(f"Fetched {len(data)} proposals from page {page}.")
-            all_proposals.extend(data)
-            page += 1
-        except requests.exceptions.HTTPError as http_err:
-            print(f"❌ HTTP error occurred during Blockfrost fetch: {http_err}")
-            print(f"❌ Server response: {response.text}")
-            return None
-        except requests.exceptions.RequestException as req_err:
-            print(f"❌ An error occurred during Blockfrost request: {req_err}")
-            return None
+    try:
+        with ThreadPoolExecutor(max_workers=BF_PAGE_CONCURRENCY) as executor:
+            pages = [1]
+            while pages:
+                # map() yields results in page order, so proposals stay in API order.
+                results = executor.map(lambda page: fetch_governance_page(headers, page), pages)
+                for page, data in zip(pages, results):
+                    if data:
+                        print(f"Fetched {len(data)} proposals from page {page}.")
+                        all_proposals.extend(data)
+                    if len(data) < BF_PAGE_SIZE:
+                        print("Reached the last page of results.")
+                        pages = []
+                        break
+                else:
+                    next_page = pages[-1] + 1
+                    pages = list(range(next_page, next_page + BF_PAGE_CONCURRENCY))
+    except requests.exceptions.HTTPError as http_err:
+        print(f"❌ HTTP error occurred during Blockfrost fetch: {http_err}")
+        print(f"❌ Server response: {http_err.response.text}")
+        return None
+    except requests.exceptions.RequestException as req_err:
+        print(f"❌ An error occurred during Blockfrost request: {req_err}")
+        return None
             
     return all_proposals
 
@@ -83,23 +112,26 @@ def convert_proposals_to_csv(proposals):
         'anchor_url', 'anchor_data_hash', 'committee_votes'
     ]
     
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
+    # Build plain tuples in column order and let csv.writer emit them in one call.
+    rows = [
+        (
+            proposal.get('proposal_id', ''),
+            proposal.get('tx_hash', ''),
+            proposal.get('output_index', ''),
+            proposal.get('type', ''),
+            proposal.get('expiry_epoch'),
+            proposal.get('ratified_epoch'),
+            proposal.get('enacted_epoch'),
+            proposal.get('anchor', {}).get('url', ''),
+            proposal.get('anchor', {}).get('data_hash', ''),
+            ','.join(proposal.get('committee_votes', []))
+        )
+        for proposal in proposals
+    ]
     
-    for proposal in proposals:
-        row = {
-            'proposal_id': proposal.get('proposal_id', ''),
-            'tx_hash': proposal.get('tx_hash', ''),
-            'output_index': proposal.get('output_index', ''),
-            'type': proposal.get('type', ''),
-            'expiry_epoch': proposal.get('expiry_epoch'),
-            'ratified_epoch': proposal.get('ratified_epoch'),
-            'enacted_epoch': proposal.get('enacted_epoch'),
-            'anchor_url': proposal.get('anchor', {}).get('url', ''),
-            'anchor_data_hash': proposal.get('anchor', {}).get('data_hash', ''),
-            'committee_votes': ','.join(proposal.get('committee_votes', []))
-        }
-        writer.writerow(row)
+    writer = csv.writer(output)
+    writer.writerow(fieldnames)
+    writer.writerows(rows)
         
     return output.getvalue()
 
@@ -128,7 +160,7 @@ def create_gist(token, filename, content, description):
     }
     
     try:
-        response = requests.post(GH_API_URL, headers=headers, data=json.dumps(payload))
+        response = SESSION.post(GH_API_URL, headers=headers, data=json.dumps(payload))
         response.raise_for_status()
         
         gist_data = response.json()
@@ -158,7 +190,7 @@ def main():
         
         if csv_content:
             gh_token = get_github_token()
-            current_time_utc = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')
+            current_time_utc = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
             gist_description = f"Cardano Governance Proposals - Report from {current_time_utc}"
             
             create_gist(gh_token, GIST_FILENAME, csv_content, gist_description)
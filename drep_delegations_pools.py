@@ -5,11 +5,15 @@ import os
 import sys
 import time
 import csv
+import io
 import argparse
 import collections
 import requests
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- Configuration -----------------------------------------------------------
 # Centralized configuration for easy management of script parameters.
@@ -20,6 +24,8 @@ CONFIG = {
     "HTTP_TIMEOUT_POST": 120,
     "API_SLEEP_INTERVAL": 0.15,
     "KOIOS_POOL_INFO_BATCH_SIZE": 80,
+    "BLOCKFROST_PAGE_CONCURRENCY": 8, # Pages requested in parallel per round
+    "KOIOS_POOL_INFO_CONCURRENCY": 6, # /pool_info batches in flight at once
     "GIST_UPDATE_RETRIES": 3,
     "GIST_UPDATE_RETRY_DELAY": 5, # seconds
     "OUTPUT_CSV_GOVERNANCE_REPORT": "governance-report.csv",
@@ -34,6 +40,22 @@ logging.basicConfig(
     stream=sys.stderr
 )
 
+# --- HTTP Session ------------------------------------------------------------
+# One shared session keeps connections to Koios, Blockfrost and GitHub alive
+# across requests; transient 429/5xx responses are retried with backoff.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    # POST is safe to retry here: /pool_info is a read-only lookup. PATCH is never retried.
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"]
+    )
+))
+
 # --- Helper Functions --------------------------------------------------------
 def ada(lovelace):
     """Converts lovelace to ADA."""
@@ -71,92 +93,130 @@ def extract_homepage(parsed_meta):
 
 
 # --- Data Fetching Logic -----------------------------------------------------
+def fetch_blockfrost_pool_page(blockfrost_key, page):
+    """Fetches a single page of pool IDs from Blockfrost."""
+    url = f"{CONFIG['BLOCKFROST_BASE_URL']}/pools?page={page}"
+    # Rate limiting (429) is retried with backoff by the session's adapter.
+    r = SESSION.get(url, headers={"project_id": blockfrost_key}, timeout=CONFIG['HTTP_TIMEOUT_GET'])
+    r.raise_for_status()
+    return r.json()
+
+
 def get_all_pool_ids(blockfrost_key):
     """
     Enumerates all pool IDs, preferring Koios but falling back to Blockfrost
     if Koios results appear capped or incomplete.
+    Returns None if a Blockfrost page still fails after the retries, so a
+    report is never built from a partial pool list.
     """
     koios_url = f"{CONFIG['KOIOS_BASE_URL']}/pool_list"
     try:
         logging.info("Attempting to fetch all pool IDs from Koios...")
-        r = requests.get(koios_url, timeout=CONFIG['HTTP_TIMEOUT_GET'])
+        r = SESSION.get(koios_url, timeout=CONFIG['HTTP_TIMEOUT_GET'])
         r.raise_for_status()
         koios_ids = [p["pool_id_bech32"] for p in r.json()]
-        logging.info(f"Koios returned {len(koios_ids)} pool IDs.")
+        logging.info("Koios returned %d pool IDs.", len(koios_ids))
         if len(koios_ids) < 1000:
             return koios_ids
     except requests.RequestException as e:
-        logging.warning(f"Koios pool list fetch failed: {e}. Falling back to Blockfrost.")
+        logging.warning("Koios pool list fetch failed: %s. Falling back to Blockfrost.", e)
 
     if not blockfrost_key:
         logging.error("Blockfrost key is required as a fallback but was not provided.")
         sys.exit(1)
 
     logging.info("Using Blockfrost to enumerate all pools...")
-    all_ids, page = [], 1
-    sess = requests.Session()
-    sess.headers.update({"project_id": blockfrost_key})
-    while True:
-        try:
-            url = f"{CONFIG['BLOCKFROST_BASE_URL']}/pools?page={page}"
-            r = sess.get(url, timeout=CONFIG['HTTP_TIMEOUT_GET'])
-            if r.status_code == 429: # Rate limit
-                time.sleep(2)
-                continue
-            r.raise_for_status()
-            page_ids = r.json()
-            if not page_ids:
-                break
-            all_ids.extend(page_ids)
-            logging.info(f"Blockfrost /pools page {page}: Got {len(page_ids)} (total {len(all_ids)})")
-            page += 1
-            time.sleep(CONFIG['API_SLEEP_INTERVAL'])
-        except requests.RequestException as e:
-            logging.error(f"Blockfrost request failed on page {page}: {e}")
-            break
+    concurrency = CONFIG['BLOCKFROST_PAGE_CONCURRENCY']
+    all_ids, pages = [], list(range(1, concurrency + 1))
+    # Pages are independent, so fetch them in concurrent rounds until an empty page is seen.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while pages:
+            futures = [executor.submit(fetch_blockfrost_pool_page, blockfrost_key, page) for page in pages]
+            for page, future in zip(pages, futures):
+                try:
+                    page_ids = future.result()
+                except requests.RequestException as e:
+                    logging.error("Blockfrost request failed on page %d after retries: %s", page, e)
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                if not page_ids:
+                    pages = []
+                    break
+                all_ids.extend(page_ids)
+                logging.info("Blockfrost /pools page %d: Got %d (total %d)", page, len(page_ids), len(all_ids))
+            else:
+                pages = [page + concurrency for page in pages]
+                time.sleep(CONFIG['API_SLEEP_INTERVAL'])
     return all_ids
 
 
+def fetch_pool_info_batch(chunk):
+    """
+    Fetches detailed pool information for one batch of pool IDs from Koios.
+    If Koios rejects the batch as too large, it is split in half and each
+    half is fetched separately. Transient failures are retried with backoff
+    by the session's adapter.
+
+    Raises:
+        requests.RequestException: If the batch still fails after the retries
+        (including a 413 for a batch too small to split further).
+    """
+    r = SESSION.post(
+        f"{CONFIG['KOIOS_BASE_URL']}/pool_info",
+        json={"_pool_bech32_ids": chunk},
+        timeout=CONFIG['HTTP_TIMEOUT_POST']
+    )
+    if r.status_code == 413 and len(chunk) > 10: # Payload too large
+        half = len(chunk) // 2
+        logging.warning("413 error: Splitting batch of %d into two and retrying.", len(chunk))
+        return fetch_pool_info_batch(chunk[:half]) + fetch_pool_info_batch(chunk[half:])
+    r.raise_for_status()
+
+    rows = []
+    for p in r.json():
+        vp = p.get("voting_power", 0)
+        meta = parse_meta_json(p.get("meta_json"))
+        rows.append({
+            "pool_id": p.get("pool_id_bech32"),
+            "ticker": extract_ticker(meta),
+            "homepage": extract_homepage(meta),
+            "reward_addr_delegated_drep": p.get("reward_addr_delegated_drep"),
+            "voting_power_ada": ada(vp),
+        })
+    return rows
+
+
 def fetch_pool_info_rows(pool_ids):
-    """Fetches detailed pool information in batches from Koios."""
-    logging.info(f"Fetching detailed info for {len(pool_ids)} pools from Koios...")
-    sess = requests.Session()
-    rows, i = [], 0
+    """
+    Fetches detailed pool information in concurrent batches from Koios.
+    Returns None if any batch failed, so a partial report is never published.
+    """
+    logging.info("Fetching detailed info for %d pools from Koios...", len(pool_ids))
     batch_size = CONFIG['KOIOS_POOL_INFO_BATCH_SIZE']
-    while i < len(pool_ids):
-        chunk = pool_ids[i:i + batch_size]
-        try:
-            r = sess.post(
-                f"{CONFIG['KOIOS_BASE_URL']}/pool_info",
-                json={"_pool_bech32_ids": chunk},
-                timeout=CONFIG['HTTP_TIMEOUT_POST']
-            )
-            if r.status_code == 413: # Payload too large
-                batch_size = max(10, batch_size // 2)
-                logging.warning(f"413 error: Reducing batch size to {batch_size} and retrying.")
-                continue
-            r.raise_for_status()
-            
-            for p in r.json():
-                vp = p.get("voting_power", 0)
-                meta = parse_meta_json(p.get("meta_json"))
-                rows.append({
-                    "pool_id": p.get("pool_id_bech32"),
-                    "ticker": extract_ticker(meta),
-                    "homepage": extract_homepage(meta),
-                    "reward_addr_delegated_drep": p.get("reward_addr_delegated_drep"),
-                    "voting_power_ada": ada(vp),
-                })
-            i += len(chunk)
-            time.sleep(CONFIG['API_SLEEP_INTERVAL'])
-        except requests.RequestException as e:
-            logging.error(f"Koios /pool_info request failed: {e}. Retrying in 5s...")
-            time.sleep(5)
+    chunks = [pool_ids[i:i + batch_size] for i in range(0, len(pool_ids), batch_size)]
+    rows = []
+    with ThreadPoolExecutor(max_workers=CONFIG['KOIOS_POOL_INFO_CONCURRENCY']) as executor:
+        futures = [executor.submit(fetch_pool_info_batch, chunk) for chunk in chunks]
+        # Collect in submission order, so rows keep the pool ID order.
+        for future in futures:
+            try:
+                rows.extend(future.result())
+            except requests.RequestException as e:
+                logging.error("Koios /pool_info request failed after retries: %s", e)
+                # Drop the batches that have not started yet; the run is aborted anyway.
+                for pending in futures:
+                    pending.cancel()
+                return None
     return rows
 
 # --- Data Processing and Output ----------------------------------------------
 def generate_governance_report(rows):
-    """Generates the final governance report CSV."""
+    """
+    Generates the final governance report CSV.
+    Returns the report text as read back from the file, so it can be
+    published without touching the disk again.
+    """
     report_rows = []
     for row in rows:
         drep_delegation = row.get("reward_addr_delegated_drep")
@@ -172,28 +232,50 @@ def generate_governance_report(rows):
                 # If it's delegated, but not to the special DReps, label as 'Other'.
                 vote_status = "Other"
 
-        report_rows.append({
-            "pool_id": row.get("pool_id"),
-            "ticker": row.get("ticker"),
-            "homepage": row.get("homepage"),
-            "voting_power_ada": f'{row.get("voting_power_ada", 0):.6f}',
+        # Tuples in the fixed column order below; csv.writer skips DictWriter's per-field lookups.
+        report_rows.append((
+            row.get("pool_id"),
+            row.get("ticker"),
+            row.get("homepage"),
+            f'{row.get("voting_power_ada", 0):.6f}',
             # The 'status' column from the example cannot be determined with current data.
-            "status": "Unknown", 
-            "vote": vote_status
-        })
+            "Unknown",
+            vote_status
+        ))
+
+    output = io.StringIO()
+    # Use the exact fieldnames from the example CSV
+    fieldnames = ["pool_id", "ticker", "homepage", "voting_power_ada", "status", "vote"]
+    writer = csv.writer(output)
+    writer.writerow(fieldnames)
+    writer.writerows(report_rows)
+    content = output.getvalue()
 
     output_path = CONFIG['OUTPUT_CSV_GOVERNANCE_REPORT']
     with open(output_path, "w", newline="", encoding="utf-8") as f:
-        # Use the exact fieldnames from the example CSV
-        fieldnames = ["pool_id", "ticker", "homepage", "voting_power_ada", "status", "vote"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(report_rows)
-    logging.info(f"Wrote {len(report_rows)} rows to {output_path}")
+        f.write(content)
+    logging.info("Wrote %d rows to %s", len(report_rows), output_path)
+    # Translate newlines as reading the file back in text mode would, which is
+    # the text the Gist has always been given.
+    return io.StringIO(content, newline=None).read()
 
 
 # --- Gist Publishing Logic ---------------------------------------------------
-def update_github_gist_with_retries():
+def build_gist_body(content):
+    """
+    Returns the encoded Gist PATCH body for the report CSV text.
+    The body is serialized once so every retry sends the same bytes without
+    re-encoding the report.
+    """
+    data = {
+        'description': 'Cardano Pool Governance Report',
+        'files': {
+            CONFIG['GIST_FILENAME']: {'content': content}
+        }
+    }
+    return json.dumps(data).encode('utf-8')
+
+def update_github_gist_with_retries(content):
     """
     Updates a GitHub Gist with the generated governance report, with retries on failure.
     """
@@ -205,38 +287,28 @@ def update_github_gist_with_retries():
         logging.error("GIST_ID or GITHUB_TOKEN environment variables not found. Skipping Gist update.")
         return
 
-    source_file = CONFIG['OUTPUT_CSV_GOVERNANCE_REPORT']
-    try:
-        with open(source_file, 'r', encoding='utf-8') as f:
-            csv_content = f.read()
-    except FileNotFoundError:
-        logging.error(f"Source file {source_file} not found for Gist update.")
-        return
+    # Serialize once; every retry sends the same bytes.
+    body = build_gist_body(content)
 
     headers = {
         'Authorization': f'token {github_token}',
         'Accept': 'application/vnd.github.v3+json',
-    }
-    data = {
-        'description': 'Cardano Pool Governance Report',
-        'files': {
-            CONFIG['GIST_FILENAME']: {'content': csv_content}
-        }
+        'Content-Type': 'application/json',
     }
     url = f'https://api.github.com/gists/{gist_id}'
 
     for attempt in range(CONFIG['GIST_UPDATE_RETRIES']):
-        logging.info(f"Attempting to update Gist (try {attempt + 1}/{CONFIG['GIST_UPDATE_RETRIES']})...")
+        logging.info("Attempting to update Gist (try %d/%d)...", attempt + 1, CONFIG['GIST_UPDATE_RETRIES'])
         try:
-            response = requests.patch(url, headers=headers, data=json.dumps(data), timeout=CONFIG['HTTP_TIMEOUT_POST'])
+            response = SESSION.patch(url, headers=headers, data=body, timeout=CONFIG['HTTP_TIMEOUT_POST'])
             response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
             
-            logging.info(f"✅ Gist updated successfully! URL: {response.json()['html_url']}")
+            logging.info("✅ Gist updated successfully! URL: %s", response.json()['html_url'])
             return # Success, exit the function
         except requests.RequestException as e:
-            logging.warning(f"Gist update attempt {attempt + 1} failed: {e}")
+            logging.warning("Gist update attempt %d failed: %s", attempt + 1, e)
             if attempt < CONFIG['GIST_UPDATE_RETRIES'] - 1:
-                logging.info(f"Retrying in {CONFIG['GIST_UPDATE_RETRY_DELAY']} seconds...")
+                logging.info("Retrying in %s seconds...", CONFIG['GIST_UPDATE_RETRY_DELAY'])
                 time.sleep(CONFIG['GIST_UPDATE_RETRY_DELAY'])
             else:
                 logging.error("All Gist update attempts failed.")
@@ -254,20 +326,23 @@ def main():
 
     # 1. Fetch Data
     pool_ids = get_all_pool_ids(args.blockfrost_key)
+    if pool_ids is None:
+        logging.error("Failed to enumerate pool IDs. Exiting without writing or publishing the report.")
+        return
     if not pool_ids:
         logging.error("No pool IDs were found. Exiting.")
         return
     
     rows = fetch_pool_info_rows(pool_ids)
     if not rows:
-        logging.error("Failed to fetch detailed pool info. Exiting.")
+        logging.error("Failed to fetch detailed pool info. Exiting without writing or publishing the report.")
         return
 
     # 2. Process and Write Local Report File
-    generate_governance_report(rows)
+    report_csv = generate_governance_report(rows)
 
     # 3. Publish to Gist
-    update_github_gist_with_retries()
+    update_github_gist_with_retries(report_csv)
     
     # 4. Add a small delay to ensure logs are flushed before the action runner exits
     logging.info("Waiting a few seconds for logs to flush...")
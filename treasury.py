@@ -1,98 +1,143 @@
 import requests
 import json
 import os
-from decimal import Decimal, getcontext
-
-# Set precision for Decimal calculations
-getcontext().prec = 28
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Koios returns at most this many rows per page, so each request covers this many epochs
+KOIOS_PAGE_SIZE = 1000
+# Epoch ranges requested in parallel once the first range comes back full
+PAGE_CONCURRENCY = 4
+
+# Shared session so the Koios and GitHub calls reuse kept-alive connections
+SESSION = requests.Session()
+SESSION.headers.update({"Accept": "application/json"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
 
 # --- Helper Functions ---
 
-def lovelace_to_ada(lovelace):
-    """Converts a Lovelace value to ADA."""
-    return Decimal(lovelace) / Decimal(1_000_000)
+def format_ada(lovelace):
+    """Formats an integer Lovelace amount as an ADA string with two decimals."""
+    # Round to whole centi-ADA (half to even, as Decimal formatting did) in plain ints.
+    centi, remainder = divmod(abs(lovelace), 10_000)
+    if remainder > 5_000 or (remainder == 5_000 and centi % 2):
+        centi += 1
+    ada, cents = divmod(centi, 100)
+    sign = "-" if lovelace < 0 else ""
+    return f"{sign}{ada}.{cents:02d}"
 
 # --- Data Gathering Functions ---
 
-def get_current_treasury_balance():
-    """Fetches the current total balance of the Cardano treasury and returns it."""
-    api_url = "https://api.koios.rest/api/v1/totals?order=epoch_no.desc&limit=1"
-    try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if not data:
-            return None
-        lovelace_balance = int(data[0].get('treasury'))
-        return lovelace_to_ada(lovelace_balance)
-    except Exception as e:
-        print(f"An unexpected error occurred while fetching total balance: {e}")
-        return None
+def fetch_totals_range(first_epoch):
+    """
+    Fetches per-epoch totals for KOIOS_PAGE_SIZE epochs starting at first_epoch,
+    ordered chronologically. Filtering on epoch_no instead of using an offset
+    lets the server seek straight to the range.
+    """
+    last_epoch = first_epoch + KOIOS_PAGE_SIZE
+    totals_url = f"https://api.koios.rest/api/v1/totals?and=(epoch_no.gte.{first_epoch},epoch_no.lt.{last_epoch})&order=epoch_no.asc"
+    totals_response = SESSION.get(totals_url, timeout=30)
+    totals_response.raise_for_status()
+    return totals_response.json()
+
+
+def history_row(epoch, treasury_previous, treasury_current):
+    """Builds the history entry for one epoch from its own and the previous closing balance."""
+    net_change = treasury_current - treasury_previous
+    return {
+        "epoch": epoch,
+        "inflow_ada": format_ada(max(0, net_change)),
+        "outflow_ada": format_ada(max(0, -net_change)),
+        "net_change_ada": format_ada(net_change),
+        "final_balance_ada": format_ada(treasury_current)
+    }
 
 
-def get_main_treasury_history():
+def get_main_treasury_history(start_epoch=208):
     """
-    Tracks the movements of the main Cardano treasury for all epochs since the start (epoch 208).
+    Tracks the movements of the main Cardano treasury for every epoch after start_epoch.
+    By default this is the full history since the start of the Shelley era (epoch 208),
+    which introduced the treasury; start_epoch itself only serves as the baseline.
     """
-    print(f"\n📜 Fetching full treasury history since Shelley era (Epoch 208)...")
-    
-    # The Shelley era, which introduced the treasury, started at epoch 208.
-    start_epoch = 208
-    history_data = []
-    all_epoch_totals = []
-    offset = 0
+    print(f"\n📜 Fetching treasury history since epoch {start_epoch}...")
 
     try:
-        # The Koios API is paginated (1000 results per page). We need to loop to get all pages.
-        while True:
-            print(f"   Fetching page starting at offset {offset}...", end='\r')
-            # We fetch all totals starting from epoch 208, ordered chronologically.
-            totals_url = f"https://api.koios.rest/api/v1/totals?epoch_no=gte.{start_epoch}&order=epoch_no.asc&offset={offset}"
-            totals_response = requests.get(totals_url, timeout=30)
-            totals_response.raise_for_status()
-            page_data = totals_response.json()
-            
-            if not page_data:
-                # If a page returns no data, we've reached the end.
-                break
-            
-            all_epoch_totals.extend(page_data)
-            
-            if len(page_data) < 1000:
-                # If we get less than 1000 results, it's the last page.
-                break
-                
-            offset += 1000
+        # The Koios API returns at most 1000 results per request. Every epoch has a
+        # totals row, so we fetch epoch ranges of that size starting from start_epoch;
+        # after a full first range, the following ranges are requested
+        # PAGE_CONCURRENCY at a time.
+        print(f"   Fetching epochs starting at {start_epoch}...", end='\r')
+        all_epoch_totals = fetch_totals_range(start_epoch)
+        next_epoch = start_epoch + KOIOS_PAGE_SIZE
+        last_page_full = len(all_epoch_totals) == KOIOS_PAGE_SIZE
+
+        with ThreadPoolExecutor(max_workers=PAGE_CONCURRENCY) as executor:
+            while last_page_full:
+                print(f"   Fetching epochs starting at {next_epoch}...", end='\r')
+                first_epochs = [next_epoch + i * KOIOS_PAGE_SIZE for i in range(PAGE_CONCURRENCY)]
+                # map() yields ranges in order, so the epochs stay in sequence.
+                for page_data in executor.map(fetch_totals_range, first_epochs):
+                    all_epoch_totals.extend(page_data)
+                    # If a range is not full (or empty), it reached the latest epoch.
+                    last_page_full = len(page_data) == KOIOS_PAGE_SIZE
+                    if not last_page_full:
+                        break
+                next_epoch = first_epochs[-1] + KOIOS_PAGE_SIZE
 
         print("\nAll epoch data fetched. Processing history...")
-        totals_data = {item['epoch_no']: item for item in all_epoch_totals}
-
-        # Iterate through the epochs we have data for to calculate changes.
-        sorted_epochs = sorted(totals_data.keys())
-        for i in range(1, len(sorted_epochs)):
-            current_epoch_num = sorted_epochs[i]
-            previous_epoch_num = sorted_epochs[i-1]
-
-            treasury_current = Decimal(totals_data[current_epoch_num]['treasury'])
-            treasury_previous = Decimal(totals_data[previous_epoch_num]['treasury'])
-            net_change = treasury_current - treasury_previous
-
-            inflow_ada = lovelace_to_ada(max(Decimal(0), net_change))
-            outflow_ada = lovelace_to_ada(-min(Decimal(0), net_change))
-            
-            history_data.append({
-                "epoch": current_epoch_num,
-                "inflow_ada": f"{inflow_ada:.2f}",
-                "outflow_ada": f"{outflow_ada:.2f}",
-                "net_change_ada": f"{lovelace_to_ada(net_change):.2f}",
-                "final_balance_ada": f"{lovelace_to_ada(treasury_current):.2f}"
-            })
-        return history_data
+        rows = sorted(all_epoch_totals, key=itemgetter('epoch_no'))
+        # Parse each epoch's balance once; every value is used by two adjacent pairs.
+        balances = [int(row['treasury']) for row in rows]
+
+        # Walk adjacent pairs of epochs we have data for to calculate changes.
+        return [
+            history_row(current['epoch_no'], treasury_previous, treasury_current)
+            for current, treasury_previous, treasury_current in zip(rows[1:], balances, balances[1:])
+        ]
     except Exception as e:
         print(f"An error occurred during treasury history tracking: {e}")
         return []
 
-# --- Gist Update Function ---
+# --- Gist Functions ---
+
+def get_published_history(gist_id, github_token, filename):
+    """
+    Reads the treasury history from the currently published Gist file.
+    Returns an empty list if it cannot be read, in which case the full
+    history is fetched again.
+    """
+    api_url = f"https://api.github.com/gists/{gist_id}"
+    headers = {
+        'Authorization': f'Bearer {github_token}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+    print("🔍 Reading previously published history from the Gist...")
+    try:
+        response = SESSION.get(api_url, headers=headers, timeout=20)
+        response.raise_for_status()
+        gist_file = response.json().get("files", {}).get(filename)
+        if not gist_file:
+            return []
+
+        content = gist_file.get("content", "")
+        if gist_file.get("truncated"):
+            # Large files are truncated in the API response; fetch the raw file instead.
+            raw_response = SESSION.get(gist_file["raw_url"], timeout=20)
+            raw_response.raise_for_status()
+            content = raw_response.text
+
+        history = json.loads(content).get("history", [])
+        print(f"✅ Found {len(history)} previously published epochs.")
+        return history
+    except (requests.exceptions.RequestException, ValueError, AttributeError, KeyError) as e:
+        print(f"⚠️ Could not read published history, fetching it in full: {e}")
+        return []
 
 def update_gist(gist_id, github_token, filename, content):
     """
@@ -112,7 +157,7 @@ def update_gist(gist_id, github_token, filename, content):
         }
     }
     try:
-        response = requests.patch(api_url, headers=headers, data=json.dumps(payload), timeout=20)
+        response = SESSION.patch(api_url, headers=headers, json=payload, timeout=20)
         response.raise_for_status()
         print("✅ Gist updated successfully!")
     except requests.exceptions.RequestException as e:
@@ -128,16 +173,32 @@ if __name__ == "__main__":
     if not TREASURY_GIST_ID or not GIST_UPDATE_TOKEN:
         print("❌ Error: TREASURY_GIST and GIST_UPDATE_TOKEN environment variables must be set.")
     else:
+        # The filename comes from your Gist URL
+        gist_filename = "treasury.json" 
+
         # 2. Fetch the Cardano data
         print("--- Running Cardano Treasury Tracker ---")
-        current_balance = get_current_treasury_balance()
-        # The function now fetches all history by default
-        history = get_main_treasury_history()
+        # Past epochs never change, so start from the published history and only
+        # fetch what came after it. The last published epoch is recomputed, with
+        # the epoch before it as the exact Lovelace baseline.
+        published = get_published_history(TREASURY_GIST_ID, GIST_UPDATE_TOKEN, gist_filename)
+        if published:
+            last_epoch = max(row["epoch"] for row in published)
+            start_epoch = max(208, last_epoch - 1)
+            new_rows = get_main_treasury_history(start_epoch)
+            # An empty result means the fetch failed; leave history empty so nothing is published.
+            history = []
+            if new_rows:
+                history = [row for row in published if row["epoch"] <= start_epoch] + new_rows
+        else:
+            history = get_main_treasury_history()
         
-        if current_balance is not None and history:
+        if history:
             # 3. Prepare the JSON output
+            # The newest epoch's closing balance is the current treasury balance,
+            # so it comes from the history rather than a separate /totals request.
             output_data = {
-                "current_balance_ada": f"{current_balance:.2f}",
+                "current_balance_ada": history[-1]["final_balance_ada"],
                 "history": history
             }
             
@@ -145,8 +206,6 @@ if __name__ == "__main__":
             json_content = json.dumps(output_data, indent=2)
             
             # 4. Update the Gist
-            # The filename comes from your Gist URL
-            gist_filename = "treasury.json" 
             update_gist(TREASURY_GIST_ID, GIST_UPDATE_TOKEN, gist_filename, json_content)
         else:
             print("❌ Failed to fetch Cardano data. Gist will not be updated.")
@@ -1,7 +1,11 @@
 import requests
 import os
 import json
-import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rate_limiter import RateLimiter
 
 # --- Configuration ---
 # Get Gist ID and GitHub Token from environment variables (set by GitHub Actions)
@@ -11,6 +15,10 @@ GIST_FILENAME = "drep_directory.json"
 
 # Koios API base URL
 API_BASE = "https://api.koios.rest/api/v1"
+# Koios POST batches in flight at once
+MAX_CONCURRENT_REQUESTS = 8
+# Politeness limit for Koios requests (token bucket, requests per second)
+KOIOS_MAX_REQUESTS_PER_SECOND = 6
 
 # Headers for Koios and GitHub API calls
 KOIOS_HEADERS = {"Accept": "application/json"}
@@ -19,55 +27,99 @@ GITHUB_HEADERS = {
     "Authorization": f"token {GIST_TOKEN}",
 }
 
+# Shared session so every Koios/GitHub call reuses kept-alive connections.
+# Koios headers are the session defaults; GitHub calls pass their own.
+SESSION = requests.Session()
+SESSION.headers.update(KOIOS_HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+KOIOS_RATE_LIMITER = RateLimiter(KOIOS_MAX_REQUESTS_PER_SECOND)
+
 # --- Helper Functions ---
 
-def koios_paginated_fetch(endpoint):
+def koios_fetch_page(endpoint, offset, limit, select=None):
+    """
+    Fetches a single page of a paginated Koios endpoint.
+    If select is given (e.g. "drep_id"), only those columns are returned.
     """
-    Fetches all pages from a paginated Koios endpoint.
+    print(f"Fetching {endpoint} with offset {offset}...")
+    url = f"{API_BASE}/{endpoint}?limit={limit}&offset={offset}"
+    if select:
+        url += f"&select={select}"
+    KOIOS_RATE_LIMITER.acquire()
+    res = SESSION.get(url, timeout=30)
+    res.raise_for_status()
+    batch = res.json()
+    if not isinstance(batch, list):
+        raise ValueError(f"Unexpected API response from {endpoint}.")
+    return batch
+
+def koios_iter_pages(endpoint, limit=1000, select=None):
+    """
+    Lazily yields the pages of a paginated Koios endpoint, in order.
+    While the caller works on a full page, the next page is already being
+    fetched in the background (a one-page prefetch). Fetching stops at the
+    first short page, so no request is made past the end of the list.
     """
-    full_list = []
     offset = 0
-    limit = 1000
-    while True:
-        try:
-            print(f"Fetching {endpoint} with offset {offset}...")
-            url = f"{API_BASE}/{endpoint}?limit={limit}&offset={offset}"
-            res = requests.get(url, headers=KOIOS_HEADERS, timeout=30)
-            res.raise_for_status()
-            batch = res.json()
-            if not isinstance(batch, list):
-                raise ValueError(f"Unexpected API response from {endpoint}.")
-            
-            full_list.extend(batch)
-            
-            if len(batch) < limit:
-                break
+    batch = koios_fetch_page(endpoint, offset, limit, select)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while len(batch) == limit:
             offset += limit
-            time.sleep(0.2) # Be nice to the API
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching {endpoint}: {e}")
-            return None
-    return full_list
+            next_batch = executor.submit(koios_fetch_page, endpoint, offset, limit, select)
+            yield batch
+            batch = next_batch.result()
+    yield batch
 
-def koios_post_fetch_batched(endpoint, id_list, id_key, batch_size=50):
+def koios_post_fetch_batched(endpoints, ids, id_key, batch_size=50):
     """
-    Fetches data from a Koios POST endpoint in batches.
+    Fetches data from one or more Koios POST endpoints in batches.
     Reduced batch_size to 50 to avoid "Request Entity Too Large" errors.
+    `ids` may be any iterable (e.g. a generator over pages still being fetched);
+    each batch is posted to every endpoint as soon as it is full, so independent
+    endpoints are fetched side by side. Returns one result list per endpoint,
+    each in the order of ids.
     """
-    full_results = []
-    for i in range(0, len(id_list), batch_size):
-        batch = id_list[i:i + batch_size]
-        payload = {id_key: batch}
+    def fetch_batch(endpoint, number, batch):
         try:
-            print(f"Fetching {endpoint}, batch {i//batch_size + 1} of {len(id_list)//batch_size + 1}...")
-            res = requests.post(f"{API_BASE}/{endpoint}", json=payload, headers=KOIOS_HEADERS, timeout=30)
+            print(f"Fetching {endpoint}, batch {number}...")
+            KOIOS_RATE_LIMITER.acquire()
+            res = SESSION.post(f"{API_BASE}/{endpoint}", json={id_key: batch}, timeout=30)
             res.raise_for_status()
-            full_results.extend(res.json())
-            time.sleep(0.2) # Be nice to the API
+            return res.json()
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching batch for {endpoint}: {e}")
-            continue
-    return full_results
+            print(f"Error fetching batch {number} for {endpoint}: {e}")
+            return []
+
+    ids = iter(ids)
+    futures = {endpoint: [] for endpoint in endpoints}
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        number = 0
+        while True:
+            batch = list(itertools.islice(ids, batch_size))
+            if not batch:
+                break
+            number += 1
+            for endpoint in endpoints:
+                futures[endpoint].append(executor.submit(fetch_batch, endpoint, number, batch))
+        return [
+            [item for future in futures[endpoint] for item in future.result()]
+            for endpoint in endpoints
+        ]
+
+def drep_name(meta):
+    """
+    Extracts a DRep's name from its metadata, which may carry it either as
+    body.givenName or as a top-level drepName.
+    """
+    if not meta:
+        return ""
+    body = meta.get("body") or {}
+    return body.get("givenName", "") or meta.get("drepName", "")
 
 def update_gist(gist_id, filename, content):
     """
@@ -87,7 +139,7 @@ def update_gist(gist_id, filename, content):
         }
     }
     try:
-        res = requests.patch(url, headers=GITHUB_HEADERS, json=payload, timeout=30)
+        res = SESSION.patch(url, headers=GITHUB_HEADERS, json=payload, timeout=30)
         res.raise_for_status()
         print("Gist update successful!")
         return True
@@ -104,46 +156,45 @@ def main():
     """
     print("--- Starting DRep Data Fetch ---")
 
-    # 1. Get the full list of all registered DReps
-    drep_list = koios_paginated_fetch("drep_list")
-    if not drep_list:
+    # 1. Stream the IDs of all registered DReps; metadata and voting power
+    # batches are posted together while later pages of the list are still
+    # arriving. Only the drep_id column is requested, and only the IDs are kept.
+    drep_ids = []
+
+    def iter_drep_ids():
+        for page in koios_iter_pages("drep_list", select="drep_id"):
+            page_ids = [drep["drep_id"] for drep in page]
+            drep_ids.extend(page_ids)
+            yield from page_ids
+
+    try:
+        metadata_list, info_list = koios_post_fetch_batched(
+            ("drep_metadata", "drep_info"), iter_drep_ids(), "_drep_ids"
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching drep_list: {e}")
+        drep_ids = None
+    if not drep_ids:
         print("Failed to fetch DRep list. Aborting.")
         return
-    print(f"Found {len(drep_list)} total DReps.")
-    drep_ids = [d["drep_id"] for d in drep_list]
+    print(f"Found {len(drep_ids)} total DReps.")
 
-    # 2. Get DRep metadata and voting power in parallel batches
-    metadata_list = koios_post_fetch_batched("drep_metadata", drep_ids, "_drep_ids")
-    info_list = koios_post_fetch_batched("drep_info", drep_ids, "_drep_ids")
-
-    # 3. Process and combine the data
+    # 2. Process and combine the data
     print("Processing and combining data...")
     metadata_map = {item["drep_id"]: item.get("meta_json", {}) for item in metadata_list}
-    info_map = {item["drep_id"]: item for item in info_list}
-    
-    final_drep_data = []
-    for drep in drep_list:
-        drep_id = drep["drep_id"]
-        meta = metadata_map.get(drep_id, {})
-        info = info_map.get(drep_id, {})
-        
-        # Extract name from different possible metadata structures
-        name = ""
-        if meta and meta.get("body"):
-            name = meta["body"].get("givenName", "")
-        if not name and meta:
-            name = meta.get("drepName", "")
+    # Extract and convert voting power from lovelace to ADA
+    voting_power_map = {item["drep_id"]: int(item.get("amount", 0)) / 1_000_000 for item in info_list}
 
-        # Extract and convert voting power from lovelace to ADA
-        voting_power = int(info.get("amount", 0)) / 1_000_000
-
-        final_drep_data.append({
+    final_drep_data = [
+        {
             "drep_id": drep_id,
-            "name": name,
-            "voting_power": voting_power
-        })
+            "name": drep_name(metadata_map.get(drep_id)),
+            "voting_power": voting_power_map.get(drep_id, 0.0)
+        }
+        for drep_id in drep_ids
+    ]
 
-    # 4. Update the GitHub Gist
+    # 3. Update the GitHub Gist
     update_gist(GIST_ID, GIST_FILENAME, final_drep_data)
     
     print("--- DRep Data Fetch Complete ---")